@@ -1,18 +1,32 @@
 """
 数据管理模块 - 负责JSON数据的读写和历史数据管理
 """
-import json
+import bisect
+import heapq
+import operator
 import os
-from datetime import datetime, timedelta
+import orjson
+from datetime import date, datetime, timedelta
 from typing import List, Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 class DataManager:
-    def __init__(self, data_file='weather_data.json', record_file='run_record.json'):
+    def __init__(self, data_file='weather_data.json', record_file='run_record.json',
+                 stamp_file='last_run.date', pretty: bool = False, atomic: bool = False):
         self.data_file = data_file
         self.record_file = record_file
+        # 只记录最近运行日期的纯文本文件，检查是否已运行时无需解析JSON
+        self.stamp_file = stamp_file
+        # 默认紧凑输出；调试时可开启缩进便于阅读
+        self._dump_option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        # 天气数据文件是历史数据的唯一副本，始终原子写入；
+        # 运行记录和日期戳写坏了最多导致重复运行一次，默认直接覆盖，可用atomic开启原子写入
+        self.atomic = atomic
+        # 已解析的JSON缓存，按文件mtime判断是否需要重新加载
+        self._cache = {}
+        self._mtime = {}
         self._ensure_files()
     
     def _ensure_files(self):
@@ -21,82 +35,147 @@ class DataManager:
             self._save_json(self.data_file, {"records": []})
         if not os.path.exists(self.record_file):
             self._save_json(self. record_file, {})
+        if not os.path.exists(self.stamp_file):
+            # 从旧的运行记录补出日期戳，保证之后的检查结果不变
+            last_run = self._load_json(self.record_file).get('last_run_date', '')
+            self._write_file(self.stamp_file, last_run.encode('utf-8'))
     
     def _load_json(self, filepath:  str) -> dict:
-        """加载JSON文件"""
+        """
+        加载JSON文件（文件未变化时直接返回缓存）
+
+        返回的是缓存对象本身，调用方不得原地修改，需要改动时构造新的dict/list
+        """
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            mtime = os.stat(filepath).st_mtime
+            if filepath in self._cache and self._mtime.get(filepath) == mtime:
+                return self._cache[filepath]
+            with open(filepath, 'rb') as f:
+                data = orjson.loads(f.read())
+            self._cache[filepath] = data
+            self._mtime[filepath] = mtime
+            return data
         except Exception as e:
-            logger.error(f"加载{filepath}失败: {e}")
+            logger.error("加载%s失败: %s", filepath, e)
             return {}
     
+    def _write_file(self, filepath: str, content: bytes):
+        """写入文件内容（天气数据文件或开启atomic时原子写入）"""
+        if not (self.atomic or filepath == self.data_file):
+            with open(filepath, 'wb') as f:
+                f.write(content)
+            return
+        
+        # 先保存到临时文件，然后重命名（原子操作）
+        temp_file = filepath + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(content)
+        os.replace(temp_file, filepath)
+    
     def _save_json(self, filepath: str, data: dict):
         """保存JSON文件"""
         try:
-            # 先保存到临时文件，然后重命名（原子操作）
-            temp_file = filepath + '.tmp'
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            os.replace(temp_file, filepath)
-            logger.info(f"成功保存数据到{filepath}")
+            self._write_file(filepath, orjson.dumps(data, option=self._dump_option))
+            self._cache[filepath] = data
+            self._mtime[filepath] = os.stat(filepath).st_mtime
+            logger.info("成功保存数据到%s", filepath)
         except Exception as e:
-            logger. error(f"保存{filepath}失败: {e}")
+            logger. error("保存%s失败: %s", filepath, e)
             raise
     
-    def check_already_run_today(self) -> bool:
+    def check_already_run_today(self, now: Optional[datetime] = None) -> bool:
         """检查今天是否已运行"""
-        record = self._load_json(self.record_file)
-        today = datetime.now().strftime('%Y-%m-%d')
-        last_run = record.get('last_run_date')
-        return last_run == today
+        now = now or datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        try:
+            # 日期戳今天没被修改过就不可能是今天写入的，只需一次stat
+            # （git checkout 会把mtime设为当前时间，所以mtime是今天时仍需读内容确认）
+            if date.fromtimestamp(os.stat(self.stamp_file).st_mtime) != now.date():
+                return False
+            with open(self.stamp_file, 'r', encoding='utf-8') as f:
+                return f.read().strip() == today
+        except FileNotFoundError:
+            # 日期戳在初始化后被删除时，退回到运行记录
+            record = self._load_json(self.record_file)
+            return record.get('last_run_date') == today
     
-    def update_run_record(self):
+    def update_run_record(self, now: Optional[datetime] = None):
         """更新运行记录"""
+        date_str = (now or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
         record = {
-            'last_run_date': datetime.now().strftime('%Y-%m-%d'),
-            'last_run_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'last_run_date': date_str[:10],
+            'last_run_time': date_str
         }
         self._save_json(self. record_file, record)
+        self._write_file(self.stamp_file, record['last_run_date'].encode('utf-8'))
+    
+    def _insert_record(self, records: List[Dict], weather_data: Dict) -> List[Dict]:
+        """返回按日期升序插入新记录后的新列表（旧版数据按日期倒序保存，先翻转）"""
+        if records and records[0]['date'] > records[-1]['date']:
+            records = records[::-1]
+        else:
+            records = list(records)
+        bisect.insort(records, weather_data, key=operator.itemgetter('date'))
+        return records
     
     def get_historical_data(self, days: int = 7) -> List[Dict]:
         """获取最近N天的历史数据"""
         data = self._load_json(self.data_file)
-        records = data.get('records', [])
-        
-        # 按日期排序
-        records.sort(key=lambda x: x['date'], reverse=True)
         
-        # 返回最近N天的数据
-        return records[: days]
+        # 直接取日期最新的N条，不对（缓存中的）原列表排序
+        return heapq.nlargest(days, data.get('records', []), key=operator.itemgetter('date'))
     
     def save_weather_data(self, weather_data: Dict):
         """保存天气数据"""
         data = self._load_json(self.data_file)
         records = data.get('records', [])
         
-        # 添加新记录
-        records.append(weather_data)
-        
-        # 按日期排序
-        records. sort(key=lambda x: x['date'], reverse=True)
+        # 按日期升序插入新记录
+        records = self._insert_record(records, weather_data)
         
         # 只保留最近的记录（防止文件过大）
-        records = records[: 60]  # 保留最近60天
+        records = records[-60:]  # 保留最近60天
         
-        data['records'] = records
-        self._save_json(self.data_file, data)
+        self._save_json(self.data_file, {**data, 'records': records})
     
-    def cleanup_old_data(self, days: int = 30):
+    def cleanup_old_data(self, days: int = 30, now: Optional[datetime] = None):
         """清理超过指定天数的旧数据"""
         data = self._load_json(self. data_file)
         records = data.get('records', [])
         
-        cutoff_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        cutoff_date = ((now or datetime.now()) - timedelta(days=days)).strftime('%Y-%m-%d')
+        
+        # 最旧的记录也未过期时无需过滤和写回（首尾取较小值以兼容旧版倒序数据）
+        if not records or min(records[0]['date'], records[-1]['date']) >= cutoff_date:
+            logger.info("没有超过%d天的旧数据，当前保留%d条记录", days, len(records))
+            return
         
         # 过滤掉旧数据
         records = [r for r in records if r['date'] >= cutoff_date]
         
-        data['records'] = records
-        self._save_json(self.data_file, data)
-        logger.info(f"清理了超过{days}天的旧数据，当前保留{len(records)}条记录")
+        self._save_json(self.data_file, {**data, 'records': records})
+        logger.info("清理了超过%d天的旧数据，当前保留%d条记录", days, len(records))
+
+    def finalize_run(self, weather_data: Dict, retention_days: int = 30, now: Optional[datetime] = None):
+        """
+        一次性完成保存数据、清理旧数据和更新运行记录
+
+        等价于依次调用 save_weather_data、cleanup_old_data、update_run_record，
+        但天气数据文件只读写一次
+        """
+        data = self._load_json(self.data_file)
+        records = data.get('records', [])
+
+        # 按日期升序插入新记录
+        records = self._insert_record(records, weather_data)
+
+        # 记录已按日期升序，二分找到截止日期后直接切片，顺带只保留最近60天
+        now = now or datetime.now()
+        cutoff_date = (now - timedelta(days=retention_days)).strftime('%Y-%m-%d')
+        start = bisect.bisect_left(records, cutoff_date, key=operator.itemgetter('date'))
+        records = records[max(start, len(records) - 60):]
+
+        self._save_json(self.data_file, {**data, 'records': records})
+        logger.info("清理了超过%d天的旧数据，当前保留%d条记录", retention_days, len(records))
+
+        self.update_run_record(now)
@@ -3,12 +3,13 @@
 天气通知机器人 - 主脚本
 每天定时获取南京天气，进行复杂趋势分析，并推送通知
 """
-import json
 import logging
 import os
 import sys
-import time
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 from data_manager import DataManager
 from weather_analyzer import WeatherAnalyzer
@@ -34,18 +35,32 @@ class WeatherBot:
         # 加载配置
         self.config = self.load_config(config_file)
         
+        # 共享HTTP会话：复用连接，网络错误和5xx由urllib3自动重试
+        self.session = requests.Session()
+        retry = Retry(
+            # retry_times 是总尝试次数，Retry.total 只计重试次数
+            total=max(self.config['settings'].get('retry_times', 3) - 1, 0),
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504]
+        )
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry))
+        
         # 初始化各模块
         self.data_manager = DataManager()
         self.analyzer = WeatherAnalyzer(self.config)
-        self.notifier = ServerChanNotifier(self.config['serverchan']['sendkey'])
+        self.notifier = ServerChanNotifier(self.config['serverchan']['sendkey'], session=self.session)
         
         self.qweather_key = self.config['qweather']['api_key']
         self. location_id = self.config['qweather']['location_id']
+        
+        # 直接使用你的自定义域名
+        self.weather_url = "https://ng2mteh6uj.re.qweatherapi.com/v7/weather/3d"
+        logger.info("使用API域名: %s", self.weather_url)
     
     def load_config(self, config_file):
         """加载配置文件，优先使用环境变量"""
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        with open(config_file, 'rb') as f:
+            config = orjson.loads(f.read())
         
         # 优先使用环境变量中的敏感信息
         if os.getenv('QWEATHER_API_KEY'):
@@ -65,14 +80,15 @@ class WeatherBot:
         
         return config
     
-    def should_run(self) -> tuple:
+    def should_run(self, now: datetime = None) -> tuple:
         """判断是否应该运行"""
+        now = now or datetime.now()
+        
         # 检查今天是否已运行
-        if self. data_manager.check_already_run_today():
+        if self. data_manager.check_already_run_today(now):
             return False, "今天已经运行过"
         
         # 检查时间窗口
-        now = datetime.now()
         start_hour = self.config['settings']['execution_window']['start_hour']
         end_hour = self.config['settings']['execution_window']['end_hour']
         
@@ -80,57 +96,49 @@ class WeatherBot:
             return False, f"当前时间{now. hour}:{now.minute}不在执行窗口({start_hour}: 00-{end_hour}: 00)"
         
         return True, "可以执行"
-    def get_weather_forecast(self, retry_times=3) -> dict:
+    def get_weather_forecast(self) -> dict:
         """
-        获取天气预报（带重试）
+        获取天气预报（重试由Session的重试策略负责）
         """
-        # 直接使用你的自定义域名
-        url = "https://ng2mteh6uj.re.qweatherapi.com/v7/weather/3d"
-        
         params = {
             'location': self.location_id,
             'key': self.qweather_key
         }
         
-        logger.info(f"使用API域名: {url}")
+        try:
+            logger.info("正在获取天气数据...")
+            response = self.session.get(self.weather_url, params=params, timeout=10)
+            data = orjson.loads(response.content)
+        except Exception as e:
+            logger.error("获取天气数据失败: %s", e)
+            raise Exception("获取天气数据失败，已达最大重试次数") from e
         
-        for attempt in range(retry_times):
-            try:
-                logger.info(f"正在获取天气数据（第{attempt + 1}次尝试）...")
-                response = requests.get(url, params=params, timeout=10)
-                data = response.json()
-                
-                if data.get('code') == '200':
-                    # 返回明天的天气（索引1）
-                    tomorrow = data['daily'][1]
-                    
-                    # 格式化数据
-                    weather_data = {
-                        'date':  tomorrow['fxDate'],
-                        'temp_max': int(tomorrow['tempMax']),
-                        'temp_min': int(tomorrow['tempMin']),
-                        'weather': tomorrow['textDay'],
-                        'humidity': int(tomorrow['humidity']),
-                        'precipitation_probability': float(tomorrow.get('precip', 0)),
-                        'wind_scale': tomorrow['windScaleDay'],
-                        'wind_dir': tomorrow['windDirDay']
-                    }
-                    
-                    logger.info(f"成功获取天气数据: {weather_data['date']}")
-                    return weather_data
-                else: 
-                    logger.error(f"和风天气API返回错误: {data}")
-                    
-            except Exception as e: 
-                logger.error(f"获取天气数据失败（第{attempt + 1}次）: {e}")
-            
-            if attempt < retry_times - 1:
-                time. sleep(self.config['settings']['retry_interval'])
+        if data.get('code') != '200':
+            logger.error("和风天气API返回错误: %s", data)
+            raise Exception(f"和风天气API返回错误: {data.get('code')}")
+        
+        # 返回明天的天气（索引1）
+        tomorrow = data['daily'][1]
+        
+        # 格式化数据
+        weather_data = {
+            'date':  tomorrow['fxDate'],
+            'temp_max': int(tomorrow['tempMax']),
+            'temp_min': int(tomorrow['tempMin']),
+            'weather': tomorrow['textDay'],
+            'humidity': int(tomorrow['humidity']),
+            'precipitation_probability': float(tomorrow.get('precip', 0)),
+            'wind_scale': tomorrow['windScaleDay'],
+            'wind_dir': tomorrow['windDirDay']
+        }
+        # 预先计算是否为雨天，分析历史数据时无需再做字符串匹配
+        weather_data['is_rainy'] = ('雨' in weather_data['weather']
+                                    or weather_data['precipitation_probability'] > 50)
         
-        raise Exception("获取天气数据失败，已达最大重试次数")
+        logger.info("成功获取天气数据: %s", weather_data['date'])
+        return weather_data
     
 
-
     def run(self):
         """主执行流程"""
         try:
@@ -138,10 +146,13 @@ class WeatherBot:
             logger.info("天气机器人启动")
             logger.info("=" * 50)
             
+            # 本次运行统一使用同一个时间戳
+            now = datetime.now()
+            
             # 判断是否应该运行
-            should_run, reason = self.should_run()
+            should_run, reason = self.should_run(now)
             if not should_run: 
-                logger.info(f"跳过执行: {reason}")
+                logger.info("跳过执行: %s", reason)
                 return
             
             logger.info("开始执行天气分析任务")
@@ -152,7 +163,7 @@ class WeatherBot:
             # 2. 获取历史数据
             analysis_days = self.config['settings']['analysis_days']
             historical_data = self.data_manager. get_historical_data(analysis_days)
-            logger.info(f"获取到{len(historical_data)}天历史数据")
+            logger.info("获取到%d天历史数据", len(historical_data))
             
             # 3. 进行复杂趋势分析
             logger.info("开始天气趋势分析...")
@@ -170,22 +181,16 @@ class WeatherBot:
             if success:
                 logger.info("通知发送成功")
                 
-                # 6. 保存今日数据
-                self.data_manager.save_weather_data(tomorrow_weather)
-                
-                # 7. 更新运行记录
-                self.data_manager.update_run_record()
-                
-                # 8. 清理旧数据
+                # 6. 保存今日数据、清理旧数据并更新运行记录
                 retention_days = self.config['settings']['data_retention_days']
-                self.data_manager.cleanup_old_data(retention_days)
+                self.data_manager.finalize_run(tomorrow_weather, retention_days, now)
                 
                 logger.info("任务执行完成")
             else:
                 logger.error("通知发送失败")
                 
         except Exception as e: 
-            logger.error(f"任务执行出错: {e}", exc_info=True)
+            logger.error("任务执行出错: %s", e, exc_info=True)
             
             # 发送错误通知
             try: 
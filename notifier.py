@@ -3,13 +3,16 @@
 """
 import requests
 import logging
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
 class ServerChanNotifier:
-    def __init__(self, sendkey: str):
+    def __init__(self, sendkey: str, session: Optional[requests.Session] = None):
         self.sendkey = sendkey
         self.api_url = f"https://sctapi.ftqq.com/{sendkey}.send"
+        # 可传入共享的Session以复用连接
+        self.session = session or requests.Session()
     
     def send(self, title: str, content: str) -> bool:
         """
@@ -28,16 +31,16 @@ class ServerChanNotifier:
                 "desp": content
             }
             
-            response = requests.post(self.api_url, data=data, timeout=10)
+            response = self.session.post(self.api_url, data=data, timeout=10)
             result = response.json()
             
             if result.get('code') == 0:
                 logger.info("Server酱通知发送成功")
                 return True
             else:
-                logger. error(f"Server酱通知发送失败: {result}")
+                logger. error("Server酱通知发送失败: %s", result)
                 return False
                 
         except Exception as e:
-            logger.error(f"发送Server酱通知异常: {e}")
+            logger.error("发送Server酱通知异常: %s", e)
             return False
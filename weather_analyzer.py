@@ -1,13 +1,88 @@
 """
 天气分析模块 - 复杂趋势预测和智能建议
 """
-import statistics
+from bisect import bisect_right
 from typing import List, Dict, Tuple
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 穿衣建议表：最低温低于阈值时使用对应建议，超过最后一个阈值时使用末项
+_CLOTHING_TBL = (
+    (-5, "🧥 厚羽绒服 + 毛衣 + 保暖内衣"),
+    (0, "🧥 羽绒服/厚棉衣 + 毛衣"),
+    (5, "🧥 厚外套/大衣 + 毛衣"),
+    (10, "🧥 夹克/风衣 + 卫衣/毛衣"),
+    (15, "👔 外套 + 长袖"),
+    (20, "👕 长袖衬衫/卫衣"),
+    (25, "👕 短袖 + 薄外套（备用）"),
+    (None, "👕 短袖 + 短裤"),
+)
+_CLOTHING_THRESHOLDS = [t for t, _ in _CLOTHING_TBL[:-1]]
+
+# 舒适度对应的活动建议
+_COMFORT_ACTIVITY = {
+    "舒适": "🎯 天气宜人，适合户外运动、郊游、散步",
+    "较舒适": "🚶 适合适度户外活动，避免剧烈运动",
+    "偏热": "🌡️ 天气较热，户外活动请选择早晚时段，注意防暑",
+    "偏冷": "❄️ 天气较冷，户外活动请做好保暖措施",
+}
+
+# 报告各段的Markdown模板，由 format_report 统一 format_map 填充
+_HEADER_TMPL = """# 🌤️ 南京明日天气播报
+
+## 📅 基本信息
+**日期**:  {date}  
+**天气**: {weather}  
+**温度**: {temp_min}°C ~ {temp_max}°C  
+**湿度**: {humidity}%  
+**风力**: {wind_scale}
+
+"""
+
+_TEMP_TREND_TMPL = """## 📊 温度趋势分析
+**趋势**: {trend}  
+**较近期平均温度**: 最高温{max_temp_change:+.1f}°C，最低温{min_temp_change:+.1f}°C  
+**早晚温差**: {tomorrow_diff:.1f}°C  
+**近期平均温差**: {avg_hist_diff:.1f}°C  
+
+"""
+
+_PRECIP_TMPL = """## 🌧️ 降水分析
+**降水概率**: {probability}%  
+**趋势**: {rain_trend}  
+**近7天降雨**:  {recent_rainy_days}天  
+
+"""
+
+_COMFORT_TMPL = """## 🌡️ 体感舒适度
+**体感温度**: {apparent_temp}°C  
+**舒适等级**: {comfort_level}  
+
+"""
+
+_WARNINGS_TMPL = """## ⚠️ 天气预警
+{warnings}"""
+
+_SUGGESTIONS_TMPL = """## 💡 生活建议
+
+**穿衣建议**  
+{clothing}
+
+**活动建议**  
+{activity}
+
+**健康提示**  
+{health}
+
+"""
+
+_FOOTER_TMPL = """---
+*数据来源: 和风天气*  
+*生成时间: {generated_at}*
+"""
+
 class WeatherAnalyzer:
     def __init__(self, config: dict):
         self.config = config
@@ -53,15 +128,19 @@ class WeatherAnalyzer:
             return {}
         
         # 计算统计数据
-        avg_max_temp = statistics.mean(hist_max_temps)
-        avg_min_temp = statistics.mean(hist_min_temps)
+        n = len(hist_max_temps)
+        avg_max_temp = sum(hist_max_temps) / n
+        avg_min_temp = sum(hist_min_temps) / len(hist_min_temps)
         
         # 计算温度变化
         max_temp_change = tomorrow['temp_max'] - avg_max_temp
         min_temp_change = tomorrow['temp_min'] - avg_min_temp
         
         # 计算温度标准差（波动性）
-        temp_std = statistics.stdev(hist_max_temps) if len(hist_max_temps) > 1 else 0
+        if n > 1:
+            temp_std = (sum((t - avg_max_temp) ** 2 for t in hist_max_temps) / (n - 1)) ** 0.5
+        else:
+            temp_std = 0
         
         # 判断趋势
         trend = "稳定"
@@ -90,9 +169,14 @@ class WeatherAnalyzer:
         """降水趋势分析"""
         rain_prob = tomorrow.get('precipitation_probability', 0)
         
-        # 统计近期降雨天数
-        recent_rainy_days = sum(1 for h in historical 
-                                if '雨' in h.get('weather', '') or h.get('precipitation_probability', 0) > 50)
+        # 统计近期降雨天数（旧记录没有is_rainy字段时现场判断）
+        recent_rainy_days = 0
+        for h in historical:
+            is_rainy = h.get('is_rainy')
+            if is_rainy is None:
+                is_rainy = '雨' in h.get('weather', '') or h.get('precipitation_probability', 0) > 50
+            if is_rainy:
+                recent_rainy_days += 1
         
         # 判断降雨趋势
         rain_trend = "少雨"
@@ -207,22 +291,7 @@ class WeatherAnalyzer:
         temp_diff = temp_max - temp_min
     
         # 【核心】根据最低温判断早晚穿衣（这是出门时的温度）
-        if temp_min < -5:
-            morning_clothing = "🧥 厚羽绒服 + 毛衣 + 保暖内衣"
-        elif temp_min < 0:
-            morning_clothing = "🧥 羽绒服/厚棉衣 + 毛衣"
-        elif temp_min < 5:
-            morning_clothing = "🧥 厚外套/大衣 + 毛衣"
-        elif temp_min < 10:
-            morning_clothing = "🧥 夹克/风衣 + 卫衣/毛衣"
-        elif temp_min < 15:
-            morning_clothing = "👔 外套 + 长袖"
-        elif temp_min < 20:
-            morning_clothing = "👕 长袖衬衫/卫衣"
-        elif temp_min < 25:
-            morning_clothing = "👕 短袖 + 薄外套（备用）"
-        else:
-            morning_clothing = "👕 短袖 + 短裤"
+        morning_clothing = _CLOTHING_TBL[bisect_right(_CLOTHING_THRESHOLDS, temp_min)][1]
     
         # 根据温差给出中午建议
         if temp_diff >= 12:
@@ -255,16 +324,8 @@ class WeatherAnalyzer:
             return "☔ 不适宜户外活动，建议室内运动或休息"
         elif '雨' in weather or '雪' in weather:
             return "🏠 户外活动受限，可选择室内健身、看书等"
-        elif comfort == "舒适":
-            return "🎯 天气宜人，适合户外运动、郊游、散步"
-        elif comfort == "较舒适": 
-            return "🚶 适合适度户外活动，避免剧烈运动"
-        elif comfort == "偏热":
-            return "🌡️ 天气较热，户外活动请选择早晚时段，注意防暑"
-        elif comfort == "偏冷": 
-            return "❄️ 天气较冷，户外活动请做好保暖措施"
         else:
-            return "🚶 可适度户外活动"
+            return _COMFORT_ACTIVITY.get(comfort, "🚶 可适度户外活动")
     
     def _get_health_suggestion(self, trend:  str, temp_max: float, temp_min: float) -> str:
         """健康建议"""
@@ -312,68 +373,43 @@ class WeatherAnalyzer:
         warnings = analysis.get('weather_warnings', [])
         suggestions = analysis.get('suggestions', {})
         
-        report = f"""# 🌤️ 南京明日天气播报
-
-## 📅 基本信息
-**日期**:  {tomorrow['date']}  
-**天气**: {tomorrow. get('weather', '未知')}  
-**温度**: {tomorrow['temp_min']}°C ~ {tomorrow['temp_max']}°C  
-**湿度**: {tomorrow.get('humidity', '-')}%  
-**风力**: {tomorrow.get('wind_scale', '-')}
-
-"""
-        
-        # 温度趋势分析
-        if temp_trend: 
-            report += f"""## 📊 温度趋势分析
-**趋势**: {temp_trend.get('trend', '稳定')}  
-**较近期平均温度**: 最高温{temp_trend.get('max_temp_change', 0):+.1f}°C，最低温{temp_trend. get('min_temp_change', 0):+.1f}°C  
-**早晚温差**: {temp_trend.get('tomorrow_diff', 0):.1f}°C  
-**近期平均温差**: {temp_trend.get('avg_hist_diff', 0):.1f}°C  
-
-"""
-        
-        # 降水分析
-        if precip: 
-            report += f"""## 🌧️ 降水分析
-**降水概率**: {precip. get('probability', 0)}%  
-**趋势**: {precip.get('trend', '未知')}  
-**近7天降雨**:  {precip.get('recent_rainy_days', 0)}天  
-
-"""
-        
-        # 体感舒适度
-        if comfort: 
-            report += f"""## 🌡️ 体感舒适度
-**体感温度**: {comfort.get('apparent_temp', 0)}°C  
-**舒适等级**: {comfort.get('comfort_level', '未知')}  
-
-"""
-        
-        # 预警信息
-        if warnings: 
-            report += "## ⚠️ 天气预警\n"
-            for warning in warnings:
-                report += f"{warning}\n\n"
-        
-        # 生活建议
-        if suggestions: 
-            report += f"""## 💡 生活建议
-
-**穿衣建议**  
-{suggestions.get('clothing', '暂无建议')}
-
-**活动建议**  
-{suggestions.get('activity', '暂无建议')}
-
-**健康提示**  
-{suggestions.get('health', '暂无建议')}
-
-"""
-        
-        report += f"""---
-*数据来源: 和风天气*  
-*生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*
-"""
+        # 一次性准备好所有占位符的值
+        ctx = {
+            'date': tomorrow['date'],
+            'weather': tomorrow.get('weather', '未知'),
+            'temp_min': tomorrow['temp_min'],
+            'temp_max': tomorrow['temp_max'],
+            'humidity': tomorrow.get('humidity', '-'),
+            'wind_scale': tomorrow.get('wind_scale', '-'),
+            'trend': temp_trend.get('trend', '稳定'),
+            'max_temp_change': temp_trend.get('max_temp_change', 0),
+            'min_temp_change': temp_trend.get('min_temp_change', 0),
+            'tomorrow_diff': temp_trend.get('tomorrow_diff', 0),
+            'avg_hist_diff': temp_trend.get('avg_hist_diff', 0),
+            'probability': precip.get('probability', 0),
+            'rain_trend': precip.get('trend', '未知'),
+            'recent_rainy_days': precip.get('recent_rainy_days', 0),
+            'apparent_temp': comfort.get('apparent_temp', 0),
+            'comfort_level': comfort.get('comfort_level', '未知'),
+            'warnings': ''.join(f"{warning}\n\n" for warning in warnings),
+            'clothing': suggestions.get('clothing', '暂无建议'),
+            'activity': suggestions.get('activity', '暂无建议'),
+            'health': suggestions.get('health', '暂无建议'),
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
         
-        return report
+        # 按需拼接各段模板，最后统一填充
+        sections = [_HEADER_TMPL]
+        if temp_trend:
+            sections.append(_TEMP_TREND_TMPL)
+        if precip:
+            sections.append(_PRECIP_TMPL)
+        if comfort:
+            sections.append(_COMFORT_TMPL)
+        if warnings:
+            sections.append(_WARNINGS_TMPL)
+        if suggestions:
+            sections.append(_SUGGESTIONS_TMPL)
+        sections.append(_FOOTER_TMPL)
+        
+        return ''.join(sections).format_map(ctx)